@@ -7,116 +7,157 @@ This script analyzes the codebase to identify potential compatibility issues.
 import re
 import os
 import sys
+from concurrent.futures import ThreadPoolExecutor
 
-def check_flask_compatibility(file_path):
+# Single combined pattern for every rule; the group name selects the check
+_RULES = re.compile(
+    r'(?P<flask>__version__)'
+    r'|(?P<flask_cors>CORS\()'
+    r'|(?P<werkzeug>generate_password_hash|check_password_hash)'
+    r'|(?P<socketio>@s(?:ocket)?io\.on\()'
+)
+
+def check_flask_compatibility(file_path, line_no, line, content_lower):
     """Check for Flask 3.1.2 compatibility issues"""
-    issues = []
-    
-    with open(file_path, 'r') as f:
-        content = f.read()
-        lines = content.split('\n')
-    
     # Check for deprecated __version__ usage
-    if '__version__' in content and 'flask' in content.lower():
-        for i, line in enumerate(lines, 1):
-            if '__version__' in line and ('flask' in line.lower() or 'werkzeug' in line.lower()):
-                issues.append({
-                    'file': file_path,
-                    'line': i,
-                    'severity': 'warning',
-                    'message': 'Using deprecated __version__ attribute',
-                    'suggestion': 'Use importlib.metadata.version() instead'
-                })
-    
-    return issues
+    if 'flask' in content_lower and ('flask' in line.lower() or 'werkzeug' in line.lower()):
+        return {
+            'file': file_path,
+            'line': line_no,
+            'severity': 'warning',
+            'message': 'Using deprecated __version__ attribute',
+            'suggestion': 'Use importlib.metadata.version() instead'
+        }
+    return None
 
-def check_flask_cors_compatibility(file_path):
+def check_flask_cors_compatibility(file_path, line_no, line, content_lower):
     """Check for Flask-CORS 6.0.1 compatibility issues"""
-    issues = []
-    
-    with open(file_path, 'r') as f:
-        content = f.read()
-        lines = content.split('\n')
-    
     # Check for CORS configuration
-    if 'CORS(' in content:
-        for i, line in enumerate(lines, 1):
-            if 'CORS(' in line and 'cors_allowed_origins="*"' in line.lower():
-                issues.append({
-                    'file': file_path,
-                    'line': i,
-                    'severity': 'info',
-                    'message': 'CORS allows all origins (*)',
-                    'suggestion': 'Consider restricting origins in production'
-                })
-    
-    return issues
+    if 'cors_allowed_origins="*"' in line.lower():
+        return {
+            'file': file_path,
+            'line': line_no,
+            'severity': 'info',
+            'message': 'CORS allows all origins (*)',
+            'suggestion': 'Consider restricting origins in production'
+        }
+    return None
 
-def check_werkzeug_compatibility(file_path):
+def check_werkzeug_compatibility(file_path, line_no, line, content_lower):
     """Check for Werkzeug 3.1.3 compatibility issues"""
-    issues = []
-    
-    with open(file_path, 'r') as f:
-        content = f.read()
-    
-    # Check for password hashing usage (should still work)
-    if 'generate_password_hash' in content or 'check_password_hash' in content:
-        # These functions are still compatible
-        pass
-    
-    return issues
+    # Password hashing functions are still compatible
+    return None
 
-def check_socketio_compatibility(file_path):
+def check_socketio_compatibility(file_path, line_no, line, content_lower):
     """Check for python-socketio 5.14.3 compatibility"""
+    # Current event handlers should be compatible
+    return None
+
+# Files mentioning none of these cannot trigger any rule
+_KEYWORDS = ('flask', 'werkzeug', 'socketio', 'sio.on(', 'cors(')
+
+_CHECKS = {
+    'flask': check_flask_compatibility,
+    'flask_cors': check_flask_cors_compatibility,
+    'werkzeug': check_werkzeug_compatibility,
+    'socketio': check_socketio_compatibility,
+}
+
+# Directories pruned before descending: environments, caches and build output
+_SKIP_DIRS = frozenset({
+    'venv', '.venv', '__pycache__', '.git', 'node_modules',
+    '.tox', 'build', 'dist', '.mypy_cache', '.pytest_cache',
+})
+
+def _iter_py_files(root_dir):
+    """Yield paths of .py files under root_dir using cached DirEntry types"""
+    stack = [root_dir]
+    
+    while stack:
+        try:
+            it = os.scandir(stack.pop())
+        except OSError:
+            # Unreadable or vanished directory: skip it, as os.walk did
+            continue
+        with it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.name not in _SKIP_DIRS:
+                        stack.append(entry.path)
+                elif entry.name.endswith('.py') and entry.is_file(follow_symlinks=False):
+                    yield entry.path
+
+def _scan_one(file_path):
+    """Scan a single Python file and return its issues"""
     issues = []
     
-    with open(file_path, 'r') as f:
+    with open(file_path, 'r', encoding='utf-8', errors='replace') as f:
         content = f.read()
-        lines = content.split('\n')
     
-    # Check for Socket.IO event handlers
-    if '@socketio.on(' in content or '@sio.on(' in content:
-        # Current event handlers should be compatible
-        pass
+    content_lower = content.lower()
+    if not any(keyword in content_lower for keyword in _KEYWORDS):
+        return issues
+    
+    # Matches arrive in order, so count newlines only since the last one
+    line_no, last = 1, 0
+    # One issue per rule per line, however often the rule matches on it
+    seen = set()
+    for match in _RULES.finditer(content):
+        pos = match.start()
+        line_no += content.count('\n', last, pos)
+        last = pos
+        key = (match.lastgroup, line_no)
+        if key in seen:
+            continue
+        seen.add(key)
+        end = content.find('\n', pos)
+        line = content[content.rfind('\n', 0, pos) + 1:end if end >= 0 else None]
+        issue = _CHECKS[match.lastgroup](file_path, line_no, line, content_lower)
+        if issue:
+            issues.append(issue)
     
     return issues
 
 def scan_python_files(root_dir):
     """Scan all Python files for compatibility issues"""
     all_issues = []
+    paths = list(_iter_py_files(root_dir))
     
-    for dirpath, dirnames, filenames in os.walk(root_dir):
-        # Skip venv, __pycache__, .git
-        dirnames[:] = [d for d in dirnames if d not in ['venv', '__pycache__', '.git', 'node_modules']]
-        
-        for filename in filenames:
-            if filename.endswith('.py'):
-                file_path = os.path.join(dirpath, filename)
-                
-                issues = []
-                issues.extend(check_flask_compatibility(file_path))
-                issues.extend(check_flask_cors_compatibility(file_path))
-                issues.extend(check_werkzeug_compatibility(file_path))
-                issues.extend(check_socketio_compatibility(file_path))
-                
-                all_issues.extend(issues)
+    # Scanning is I/O-bound and file reads release the GIL; map() keeps
+    # the report in traversal order
+    with ThreadPoolExecutor(max_workers=min(32, (os.cpu_count() or 1) * 4)) as executor:
+        for issues in executor.map(_scan_one, paths):
+            all_issues.extend(issues)
     
     return all_issues
 
+def _format_issues(title, issues):
+    """Format one severity section of the report as a list of lines"""
+    out = [title, "-" * 70]
+    for issue in issues:
+        out.append(f"  {issue['file']}:{issue['line']}")
+        out.append(f"    {issue['message']}")
+        out.append(f"    Suggestion: {issue['suggestion']}")
+        out.append("")
+    return out
+
 def main():
-    print("=" * 70)
-    print("Code Compatibility Check for Updated Dependencies")
-    print("=" * 70)
-    print()
+    out = [
+        "=" * 70,
+        "Code Compatibility Check for Updated Dependencies",
+        "=" * 70,
+        "",
+    ]
     
     project_root = os.path.dirname(os.path.abspath(__file__))
     issues = scan_python_files(project_root)
     
     if not issues:
-        print("✓ No compatibility issues found!")
-        print()
-        print("The codebase appears to be fully compatible with the updated")
-        print("dependencies. All APIs used are still supported in the new versions.")
+        out.append("✓ No compatibility issues found!")
+        out.append("")
+        out.append("The codebase appears to be fully compatible with the updated")
+        out.append("dependencies. All APIs used are still supported in the new versions.")
+        sys.stdout.write('\n'.join(out) + '\n')
         return 0
     
     # Group issues by severity
@@ -125,35 +166,20 @@ def main():
     info = [i for i in issues if i['severity'] == 'info']
     
     if errors:
-        print(f"❌ ERRORS ({len(errors)}):")
-        print("-" * 70)
-        for issue in errors:
-            print(f"  {issue['file']}:{issue['line']}")
-            print(f"    {issue['message']}")
-            print(f"    Suggestion: {issue['suggestion']}")
-            print()
+        out.extend(_format_issues(f"❌ ERRORS ({len(errors)}):", errors))
     
     if warnings:
-        print(f"⚠️  WARNINGS ({len(warnings)}):")
-        print("-" * 70)
-        for issue in warnings:
-            print(f"  {issue['file']}:{issue['line']}")
-            print(f"    {issue['message']}")
-            print(f"    Suggestion: {issue['suggestion']}")
-            print()
+        out.extend(_format_issues(f"⚠️  WARNINGS ({len(warnings)}):", warnings))
     
     if info:
-        print(f"ℹ️  INFORMATIONAL ({len(info)}):")
-        print("-" * 70)
-        for issue in info:
-            print(f"  {issue['file']}:{issue['line']}")
-            print(f"    {issue['message']}")
-            print(f"    Suggestion: {issue['suggestion']}")
-            print()
-    
-    print("=" * 70)
-    print(f"Summary: {len(errors)} errors, {len(warnings)} warnings, {len(info)} info")
-    print("=" * 70)
+        out.extend(_format_issues(f"ℹ️  INFORMATIONAL ({len(info)}):", info))
+    
+    out.append("=" * 70)
+    out.append(f"Summary: {len(errors)} errors, {len(warnings)} warnings, {len(info)} info")
+    out.append("=" * 70)
+    
+    # Write the whole report at once rather than one print() per line
+    sys.stdout.write('\n'.join(out) + '\n')
     
     # Return non-zero only for errors, not warnings
     return 1 if errors else 0
@@ -1,44 +1,93 @@
-import socketio
-import requests
 import os
 import getpass
-from typing import Optional
+import logging
+
+# orjson is optional; fall back to the stdlib encoder when it isn't installed
+try:
+    import orjson
+    _json_dumps = orjson.dumps
+    _json_loads = orjson.loads
+except ImportError:
+    import json
+    
+    def _json_dumps(obj):
+        return json.dumps(obj).encode()
+    
+    _json_loads = json.loads
+
+_JSON_HEADERS = {'Content-Type': 'application/json'}
+
+logger = logging.getLogger('authclient')
 
 class AuthClient:
-    def __init__(self, server_url: str = None):
+    __slots__ = (
+        'server_url', 'api_url', '_endpoints', 'http', 'sio',
+        'authenticated', 'current_user'
+    )
+    
+    def __init__(self, server_url: str | None = None):
         self.server_url = server_url or os.environ.get('SERVER_URL', 'http://localhost:5000')
         self.api_url = f"{self.server_url}/api"
-        self.sio = socketio.Client()
+        self._endpoints = {
+            'signup': f"{self.api_url}/signup",
+            'login': f"{self.api_url}/login",
+            'verify': f"{self.api_url}/verify-email",
+            'resend': f"{self.api_url}/resend-verification"
+        }
+        
+        # Imported here so loading this module stays cheap
+        import requests
+        from requests.adapters import HTTPAdapter
+        
+        # Keep-alive session so repeated API calls reuse the TCP/TLS connection
+        self.http = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=4)
+        self.http.mount('http://', adapter)
+        self.http.mount('https://', adapter)
+        
+        # Socket.IO client is created on first use; the HTTP-only menu
+        # options never pay for importing it
+        self.sio = None
         self.authenticated = False
         self.current_user = None
-        
-        # Setup Socket.IO event handlers
-        self.setup_socketio_handlers()
+    
+    def _socketio(self):
+        """Return the Socket.IO client, creating it on first use"""
+        if self.sio is None:
+            import socketio
+            
+            # Share the pool and cookies with the Socket.IO handshake
+            self.sio = socketio.Client(http_session=self.http)
+            
+            # Setup Socket.IO event handlers
+            self.setup_socketio_handlers()
+        return self.sio
     
     def setup_socketio_handlers(self):
         @self.sio.on('connected')
         def on_connected(data):
-            print(f"✓ Connected to server: {data.get('message')}")
+            logger.info("✓ Connected to server: %s", data.get('message'))
         
         @self.sio.on('auth_success')
         def on_auth_success(data):
             self.authenticated = True
             self.current_user = data.get('user')
-            print(f"✓ Authentication successful! Welcome, {self.current_user['username']}")
+            logger.info("✓ Authentication successful! Welcome, %s", self.current_user['username'])
         
         @self.sio.on('auth_error')
         def on_auth_error(data):
-            print(f"✗ Authentication error: {data.get('error')}")
+            logger.error("✗ Authentication error: %s", data.get('error'))
         
         @self.sio.on('message')
         def on_message(data):
-            print(f"Message from server: {data}")
+            logger.info("Message from server: %s", data)
     
     def connect(self):
         """Connect to the server via Socket.IO"""
         try:
             print(f"Connecting to {self.server_url}...")
-            self.sio.connect(self.server_url)
+            # WebSocket only: skips the long-polling handshake and upgrade round-trip
+            self._socketio().connect(self.server_url, transports=['websocket'], wait_timeout=5)
             return True
         except Exception as e:
             print(f"✗ Connection error: {e}")
@@ -46,28 +95,35 @@ class AuthClient:
     
     def disconnect(self):
         """Disconnect from the server"""
-        if self.sio.connected:
+        if self.sio is not None and self.sio.connected:
             self.sio.disconnect()
             print("Disconnected from server")
+        self.http.close()
+    
+    def _post(self, endpoint: str, payload: dict):
+        """POST a JSON payload to one of the API endpoints"""
+        return self.http.post(
+            self._endpoints[endpoint],
+            data=_json_dumps(payload),
+            headers=_JSON_HEADERS,
+            timeout=10
+        )
     
     def signup(self, username: str, email: str, password: str) -> bool:
         """Sign up a new user"""
         try:
-            response = requests.post(
-                f"{self.api_url}/signup",
-                json={
-                    'username': username,
-                    'email': email,
-                    'password': password
-                }
-            )
+            response = self._post('signup', {
+                'username': username,
+                'email': email,
+                'password': password
+            })
             
             if response.status_code == 201:
-                data = response.json()
+                data = _json_loads(response.content)
                 print(f"✓ {data['message']}")
                 return True
             else:
-                error = response.json().get('error', 'Unknown error')
+                error = _json_loads(response.content).get('error', 'Unknown error')
                 print(f"✗ Signup failed: {error}")
                 return False
         
@@ -78,20 +134,17 @@ class AuthClient:
     def verify_email(self, email: str, code: str) -> bool:
         """Verify email with the provided code"""
         try:
-            response = requests.post(
-                f"{self.api_url}/verify-email",
-                json={
-                    'email': email,
-                    'code': code
-                }
-            )
+            response = self._post('verify', {
+                'email': email,
+                'code': code
+            })
             
             if response.status_code == 200:
-                data = response.json()
+                data = _json_loads(response.content)
                 print(f"✓ {data['message']}")
                 return True
             else:
-                error = response.json().get('error', 'Unknown error')
+                error = _json_loads(response.content).get('error', 'Unknown error')
                 print(f"✗ Verification failed: {error}")
                 return False
         
@@ -102,22 +155,19 @@ class AuthClient:
     def login_http(self, username: str, password: str) -> bool:
         """Login via HTTP API"""
         try:
-            response = requests.post(
-                f"{self.api_url}/login",
-                json={
-                    'username': username,
-                    'password': password
-                }
-            )
+            response = self._post('login', {
+                'username': username,
+                'password': password
+            })
             
             if response.status_code == 200:
-                data = response.json()
+                data = _json_loads(response.content)
                 self.current_user = data['user']
                 print(f"✓ {data['message']}")
                 print(f"Welcome, {self.current_user['username']}!")
                 return True
             else:
-                error = response.json().get('error', 'Unknown error')
+                error = _json_loads(response.content).get('error', 'Unknown error')
                 print(f"✗ Login failed: {error}")
                 return False
         
@@ -127,7 +177,7 @@ class AuthClient:
     
     def authenticate_socketio(self, username: str, password: str):
         """Authenticate via Socket.IO"""
-        if not self.sio.connected:
+        if self.sio is None or not self.sio.connected:
             print("✗ Not connected to server. Please connect first.")
             return False
         
@@ -139,7 +189,7 @@ class AuthClient:
     
     def send_message(self, message: str):
         """Send a message via Socket.IO"""
-        if not self.sio.connected:
+        if self.sio is None or not self.sio.connected:
             print("✗ Not connected to server")
             return False
         
@@ -149,17 +199,14 @@ class AuthClient:
     def resend_verification(self, email: str) -> bool:
         """Resend verification code"""
         try:
-            response = requests.post(
-                f"{self.api_url}/resend-verification",
-                json={'email': email}
-            )
+            response = self._post('resend', {'email': email})
             
             if response.status_code == 200:
-                data = response.json()
+                data = _json_loads(response.content)
                 print(f"✓ {data['message']}")
                 return True
             else:
-                error = response.json().get('error', 'Unknown error')
+                error = _json_loads(response.content).get('error', 'Unknown error')
                 print(f"✗ Failed: {error}")
                 return False
         
@@ -236,4 +283,5 @@ def interactive_menu():
             print("Invalid option. Please try again.")
 
 if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
     interactive_menu()
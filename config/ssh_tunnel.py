@@ -7,18 +7,25 @@ communication between client and server applications.
 
 import subprocess
 import os
+import re
+import select
+import socket
 import time
-from typing import Optional
 
 class SSHTunnel:
+    __slots__ = (
+        'ssh_host', 'ssh_port', 'ssh_user', 'local_port', 'remote_port',
+        'ssh_key_path', 'control_path', 'tunnel_process', 'master_pid', '_ssh_argv'
+    )
+    
     def __init__(
         self,
         ssh_host: str,
         ssh_port: int = 22,
-        ssh_user: str = None,
+        ssh_user: str | None = None,
         local_port: int = 5000,
         remote_port: int = 5000,
-        ssh_key_path: Optional[str] = None
+        ssh_key_path: str | None = None
     ):
         """
         Initialize SSH Tunnel configuration
@@ -30,6 +37,9 @@ class SSHTunnel:
             local_port: Local port to forward (default: 5000)
             remote_port: Remote port on SSH server (default: 5000)
             ssh_key_path: Path to SSH private key (optional)
+        
+        Raises:
+            FileNotFoundError: If ssh_key_path is set but does not exist
         """
         self.ssh_host = ssh_host
         self.ssh_port = ssh_port
@@ -37,69 +47,219 @@ class SSHTunnel:
         self.local_port = local_port
         self.remote_port = remote_port
         self.ssh_key_path = ssh_key_path or os.environ.get('SSH_KEY_PATH')
+        # Shared master connection so restarts skip the full SSH handshake
+        self.control_path = os.path.expanduser('~/.ssh/cm-%r@%h:%p')
         self.tunnel_process = None
+        # PID of the master holding our forwarding, read once from `ssh -O check`
+        self.master_pid = None
+        
+        if self.ssh_key_path and not os.path.exists(self.ssh_key_path):
+            raise FileNotFoundError(f"SSH key not found: {self.ssh_key_path}")
+        
+        # Build the SSH command once; start_tunnel reuses it on every restart
+        self._ssh_argv = [
+            'ssh',
+            '-N',  # Don't execute remote command
+            '-L', self._forward_spec(),  # Local port forwarding
+            '-p', str(self.ssh_port),
+            '-o', 'ExitOnForwardFailure=yes',  # Fail fast if the port can't be bound
+            '-o', 'ConnectTimeout=5',
+            '-o', 'ControlMaster=auto',
+            '-o', f'ControlPath={self.control_path}',
+            '-o', 'ControlPersist=600',
+            '-o', 'ServerAliveInterval=30',
+        ]
+        
+        # Add SSH key if provided
+        if self.ssh_key_path:
+            self._ssh_argv.extend(['-i', self.ssh_key_path])
+        
+        # Add user@host
+        self._ssh_argv.append(f'{self.ssh_user}@{self.ssh_host}')
+    
+    def _control_argv(self, command: str, *extra: str) -> list[str]:
+        """ssh argv sending a control command (-O check/forward/cancel/exit) to the master"""
+        return [
+            'ssh', '-O', command, *extra,
+            '-o', f'ControlPath={self.control_path}',
+            '-p', str(self.ssh_port),
+            f'{self.ssh_user}@{self.ssh_host}'
+        ]
+    
+    def _control(self, command: str, *extra: str) -> int:
+        """Send a control command to the master; returns ssh's exit code"""
+        try:
+            return subprocess.run(
+                self._control_argv(command, *extra),
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                timeout=5
+            ).returncode
+        except (OSError, subprocess.TimeoutExpired):
+            return 255
+    
+    def _read_master_pid(self) -> int | None:
+        """PID reported by `ssh -O check` ("Master running (pid=N)"), or None if no master is up"""
+        try:
+            result = subprocess.run(
+                self._control_argv('check'),
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.PIPE,
+                timeout=5
+            )
+        except (OSError, subprocess.TimeoutExpired):
+            return None
+        match = re.search(rb'pid=(\d+)', result.stderr)
+        return int(match.group(1)) if result.returncode == 0 and match else None
+    
+    def _forward_spec(self) -> str:
+        """The -L argument: local_port -> localhost:remote_port on the server"""
+        return f'{self.local_port}:localhost:{self.remote_port}'
     
-    def start_tunnel(self) -> bool:
+    def _port_open(self) -> bool:
+        """True if something accepts connections on the local forwarded port"""
+        try:
+            with socket.create_connection(('127.0.0.1', self.local_port), timeout=0.1):
+                return True
+        except OSError:
+            return False
+    
+    def start_tunnel(self, timeout: float = 5.0) -> bool:
         """
         Start SSH tunnel using subprocess
         
+        Args:
+            timeout: Seconds to wait for the forwarded port to accept connections
+        
         Returns:
             bool: True if tunnel started successfully, False otherwise
         """
         try:
-            # Build SSH command
-            ssh_cmd = [
-                'ssh',
-                '-N',  # Don't execute remote command
-                '-L', f'{self.local_port}:localhost:{self.remote_port}',  # Local port forwarding
-                '-p', str(self.ssh_port),
-            ]
-            
-            # Add SSH key if provided
-            if self.ssh_key_path and os.path.exists(self.ssh_key_path):
-                ssh_cmd.extend(['-i', self.ssh_key_path])
-            
-            # Add user@host
-            ssh_cmd.append(f'{self.ssh_user}@{self.ssh_host}')
+            os.makedirs(os.path.dirname(self.control_path), mode=0o700, exist_ok=True)
             
-            print(f"Starting SSH tunnel: {' '.join(ssh_cmd)}")
-            
-            # Start tunnel process
-            self.tunnel_process = subprocess.Popen(
-                ssh_cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE
-            )
-            
-            # Give it a moment to establish connection
-            time.sleep(2)
+            if self._control('check') == 0:
+                # A persisted master is still up: just add the forwarding to it
+                print(f"Reusing SSH master for localhost:{self.local_port}")
+                self.tunnel_process = None
+                if self._control('forward', '-L', self._forward_spec()) != 0:
+                    print("✗ SSH tunnel failed: master refused the port forwarding")
+                    return False
+            else:
+                print(f"Starting SSH tunnel: {' '.join(self._ssh_argv)}")
+                
+                # Start tunnel process
+                self.tunnel_process = subprocess.Popen(
+                    self._ssh_argv,
+                    stdout=subprocess.DEVNULL,
+                    stderr=subprocess.PIPE
+                )
+                # Never let a stderr read block the caller
+                os.set_blocking(self.tunnel_process.stderr.fileno(), False)
             
-            # Check if process is still running
-            if self.tunnel_process.poll() is None:
+            # Poll until the forwarded port accepts connections or ssh fails.
+            # With ControlPersist, ssh forks the master into the background
+            # once authenticated and the foreground process exits with 0.
+            deadline = time.monotonic() + timeout
+            while time.monotonic() < deadline:
+                code = self.tunnel_process.poll() if self.tunnel_process else None
+                if code:
+                    stderr = (self.tunnel_process.stderr.read() or b'').decode(errors='replace')
+                    print(f"✗ SSH tunnel failed: {stderr}")
+                    return False
+                
+                if not self._port_open():
+                    time.sleep(0.05)
+                    continue
+                
                 print(f"✓ SSH tunnel established on localhost:{self.local_port}")
+                self.master_pid = self._read_master_pid()
                 return True
-            else:
-                stderr = self.tunnel_process.stderr.read().decode()
-                print(f"✗ SSH tunnel failed: {stderr}")
-                return False
+            
+            print(f"✗ SSH tunnel not ready after {timeout:g}s")
+            self.stop_tunnel()
+            return False
         
         except Exception as e:
             print(f"✗ Error starting SSH tunnel: {e}")
             return False
     
     def stop_tunnel(self):
-        """Stop the SSH tunnel"""
+        """
+        Stop the SSH tunnel
+        
+        Only the port forwarding is cancelled; the master stays up for
+        ControlPersist so the next start_tunnel skips the handshake.
+        Use close_master() to shut it down as well.
+        """
+        stopped = False
         if self.tunnel_process and self.tunnel_process.poll() is None:
             self.tunnel_process.terminate()
             self.tunnel_process.wait()
+            stopped = True
+        self.tunnel_process = None
+        self.master_pid = None
+        
+        if self._control('check') == 0:
+            if self._control('cancel', '-L', self._forward_spec()) != 0:
+                print("✗ Failed to stop SSH tunnel: master refused to cancel the port forwarding")
+                return
+            stopped = True
+        
+        if stopped:
             print("✓ SSH tunnel stopped")
+        else:
+            print("✗ No SSH tunnel was running")
+    
+    def close_master(self):
+        """Shut down the persistent master connection and its forwardings"""
+        if self._control('exit') == 0:
+            print("✓ SSH master connection closed")
+        else:
+            print("✗ Failed to close SSH master connection (none running?)")
+    
+    def wait(self):
+        """Block until the tunnel goes away (ssh exits or the master shuts down)"""
+        if self.tunnel_process is not None:
+            self.tunnel_process.wait()
+            if self.tunnel_process.returncode:
+                return
+            # The foreground ssh has handed off to the backgrounded master
+            self.master_pid = self._read_master_pid()
+        if self.master_pid is None:
+            return
+        
+        # The master isn't our child, so waitpid() can't reap it; a pidfd
+        # becomes readable when it exits
+        try:
+            pidfd = os.pidfd_open(self.master_pid)
+        except (AttributeError, OSError):
+            while _pid_alive(self.master_pid):
+                time.sleep(1)
+            return
+        try:
+            select.select([pidfd], [], [])
+        finally:
+            os.close(pidfd)
     
     def is_active(self) -> bool:
         """Check if tunnel is active"""
-        return self.tunnel_process is not None and self.tunnel_process.poll() is None
+        if self.tunnel_process is not None and self.tunnel_process.poll() is None:
+            return True
+        return self.master_pid is not None and _pid_alive(self.master_pid)
+
 
+def _pid_alive(pid: int) -> bool:
+    """True if a process with this PID exists (signal 0 only checks)"""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
 
-def create_tunnel_from_env() -> Optional[SSHTunnel]:
+
+def create_tunnel_from_env() -> SSHTunnel | None:
     """
     Create SSH tunnel from environment variables
     
@@ -113,6 +273,9 @@ def create_tunnel_from_env() -> Optional[SSHTunnel]:
     
     Returns:
         SSHTunnel instance or None if required vars not set
+    
+    Raises:
+        FileNotFoundError: If SSH_KEY_PATH points to a missing file
     """
     ssh_host = os.environ.get('SSH_HOST')
     
@@ -134,7 +297,11 @@ if __name__ == '__main__':
     print("SSH Tunnel Configuration Example")
     print("=" * 50)
     
-    tunnel = create_tunnel_from_env()
+    try:
+        tunnel = create_tunnel_from_env()
+    except FileNotFoundError as e:
+        print(f"✗ {e}")
+        raise SystemExit(1)
     
     if tunnel:
         print("\nStarting tunnel...")
@@ -142,8 +309,7 @@ if __name__ == '__main__':
             print("\nTunnel is active. Press Ctrl+C to stop.")
             try:
                 # Keep the tunnel alive
-                while tunnel.is_active():
-                    time.sleep(1)
+                tunnel.wait()
             except KeyboardInterrupt:
                 print("\nStopping tunnel...")
                 tunnel.stop_tunnel()
@@ -1,47 +1,300 @@
+# Must run before anything imports socket/ssl/threading so SMTP, DB and
+# Redis I/O yield to other greenlets instead of blocking the worker
+from gevent import monkey
+monkey.patch_all()
+
+import gevent
+from concurrent.futures import ThreadPoolExecutor
+
 from flask import Flask, request, jsonify, send_from_directory
+from flask.json.provider import DefaultJSONProvider
 from flask_socketio import SocketIO, emit
 from flask_sqlalchemy import SQLAlchemy
 from flask_cors import CORS
-from werkzeug.security import generate_password_hash, check_password_hash
+from sqlalchemy import bindparam, event, inspect
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload, validates
+from werkzeug.security import check_password_hash
+from argon2 import PasswordHasher, extract_parameters
+from argon2.exceptions import InvalidHashError, VerificationError
+import orjson
+import re
 import secrets
+import sqlite3
+import hmac
+import atexit
+import logging
+import logging.handlers
+import math
 import os
 import time
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from email_service import send_verification_email
+from session_store import (
+    create_session, get_session, delete_session,
+    set_connection, get_connection, remove_connection, all_connections, count_connections,
+    refresh_connections, CONNECTION_HEARTBEAT_SECONDS
+)
+
+class _NativeQueueListener(logging.handlers.QueueListener):
+    """
+    QueueListener whose monitor runs on a real OS thread
+
+    After patch_all(), threading.Thread and queue.SimpleQueue are greenlet
+    based, so a stock listener would do its blocking writes on the hub.
+    The monitor is started with the unpatched thread primitives instead.
+    """
+    _done = None
+    
+    def start(self):
+        self._done = monkey.get_original('_thread', 'allocate_lock')()
+        self._done.acquire()
+        monkey.get_original('_thread', 'start_new_thread')(self._run, (self._done,))
+    
+    def _run(self, done):
+        try:
+            self._monitor()
+        finally:
+            done.release()
+    
+    def stop(self):
+        if self._done is not None:
+            self.enqueue_sentinel()
+            self._done.acquire(timeout=5)
+            self._done = None
+
+
+def _setup_logging():
+    """
+    Route log records through a queue drained by a background listener
+
+    Handlers only enqueue; the stderr/file writes happen in the listener's
+    OS thread, off the request path. LOG_FILE adds a size-capped rotating file sink.
+    """
+    formatter = logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s')
+    sinks = [logging.StreamHandler()]
+    if os.environ.get('LOG_FILE'):
+        sinks.append(logging.handlers.RotatingFileHandler(
+            os.environ['LOG_FILE'], maxBytes=10 * 1024 * 1024, backupCount=5
+        ))
+    for handler in sinks:
+        handler.setFormatter(formatter)
+    
+    # Unpatched C queue: put() from greenlets never blocks, get() blocks only the OS thread
+    log_queue = monkey.get_original('queue', 'SimpleQueue')()
+    listener = _NativeQueueListener(log_queue, *sinks, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    logging.basicConfig(level=logging.INFO, handlers=[logging.handlers.QueueHandler(log_queue)])
+
+
+_setup_logging()
+# Use lazy %-style arguments: failure paths can be hammered by credential
+# stuffing, and filtered records should cost nothing to format
+logger = logging.getLogger('authserver')
+
+# Argon2id is memory-hard, so GPU/ASIC guessing gains far less than against PBKDF2.
+# OWASP's 46 MiB / p=1 profile: one core per verify keeps concurrent logins
+# from contending. time_cost is calibrated to the host at startup.
+ARGON2_MEMORY_COST = 47104
+ARGON2_MIN_TIME_COST = 2
+ARGON2_MAX_TIME_COST = 32
+
+
+def _calibrated_hasher():
+    """
+    PasswordHasher whose time_cost makes one hash take ~PASSWORD_HASH_TARGET_MS
+
+    Times five hashes at the minimum cost and scales linearly from the
+    median (Argon2 time grows with passes), so startup pays for five
+    cheap hashes rather than a search up to the target.
+    """
+    target_ms = float(os.environ.get('PASSWORD_HASH_TARGET_MS', 350))
+    base = PasswordHasher(
+        time_cost=ARGON2_MIN_TIME_COST, memory_cost=ARGON2_MEMORY_COST, parallelism=1
+    )
+    samples = []
+    for _ in range(5):
+        start = time.perf_counter()
+        base.hash('calibration')
+        samples.append((time.perf_counter() - start) * 1000)
+    median_ms = sorted(samples)[2]
+    
+    time_cost = math.ceil(ARGON2_MIN_TIME_COST * target_ms / max(median_ms, 0.1))
+    time_cost = min(max(time_cost, ARGON2_MIN_TIME_COST), ARGON2_MAX_TIME_COST)
+    logger.info("Argon2 time_cost=%d (%.1f ms at t=%d, target %.0f ms)",
+                time_cost, median_ms, ARGON2_MIN_TIME_COST, target_ms)
+    return PasswordHasher(time_cost=time_cost, memory_cost=ARGON2_MEMORY_COST, parallelism=1)
+
+
+ph = _calibrated_hasher()
+# Verified against on unknown usernames so misses cost the same as wrong passwords
+_DUMMY_HASH = ph.hash(secrets.token_hex(16))
+
+
+# Verification mail goes through a small fixed pool: requests return at once and
+# a signup burst queues here instead of opening unbounded SMTP sessions
+_email_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='email')
+
+
+def _off_loop(func, *args):
+    """
+    Run a CPU-heavy call on the gevent hub's native thread pool
+
+    argon2-cffi and hashlib release the GIL while hashing, so the calling
+    greenlet waits without stalling every other socket on the worker.
+    """
+    return gevent.get_hub().threadpool.apply(func, args)
+
+
+def _verify_hash(password_hash, password):
+    """ph.verify off the event loop; False instead of raising on mismatch"""
+    try:
+        return _off_loop(ph.verify, password_hash, password)
+    except (VerificationError, InvalidHashError):
+        return False
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """JSON provider backed by orjson for jsonify() and request.get_json()"""
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self.default).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
 
-# Track connected sessions: {sid: {'user_id': id, 'username': str, 'connected_at': datetime}}
-connected_sessions = {}
 
 app = Flask(__name__, static_folder='static')
-app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', secrets.token_hex(32))
+app.json = OrjsonProvider(app)
+if os.environ.get('SECRET_KEY'):
+    app.config['SECRET_KEY'] = os.environ['SECRET_KEY']
+else:
+    # Verification codes are HMAC'd with this key, so a per-process key
+    # invalidates every pending code on restart and across workers
+    app.config['SECRET_KEY'] = secrets.token_hex(32)
+    logger.warning("SECRET_KEY is not set; using a random per-process key. "
+                   "Pending verification codes will stop working after a restart "
+                   "and on any other worker. Set SECRET_KEY outside development.")
 app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///auth.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+if not app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite'):
+    # Sized pool for server databases; pre-ping drops connections the DB closed while idle
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', 20)),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 40)),
+        'pool_pre_ping': True,
+        'pool_recycle': 1800,
+        'pool_timeout': 30
+    }
 
 CORS(app)
-db = SQLAlchemy(app)
-socketio = SocketIO(app, cors_allowed_origins="*")
+# Objects stay loaded after commit; every handler commits as its last write,
+# so re-reading them afterwards would only cost an extra SELECT
+db = SQLAlchemy(app, session_options={'expire_on_commit': False})
+socketio = SocketIO(app, cors_allowed_origins="*", async_mode='gevent')
+
+
+@event.listens_for(Engine, 'connect')
+def _sqlite_pragmas(dbapi_conn, _record):
+    """
+    Put SQLite in WAL mode: readers no longer block on the writer, and
+    synchronous=NORMAL (safe under WAL) skips an fsync per commit
+    """
+    if isinstance(dbapi_conn, sqlite3.Connection):
+        cursor = dbapi_conn.cursor()
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute('PRAGMA synchronous=NORMAL')
+        cursor.close()
+
+
+def _utcnow():
+    """Current UTC time as a naive datetime.
+
+    DateTime columns round-trip naive values (SQLite drops tzinfo), so all
+    stored and compared timestamps stay naive UTC. Replaces the deprecated
+    datetime.utcnow().
+    """
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _verification_digest(code):
+    """Keyed digest of a verification code.
+
+    A slow KDF buys nothing for a 6-digit code; the secret key is what stops
+    a leaked digest being reversed, and the 24h expiry bounds online guessing.
+    """
+    return hmac.new(app.config['SECRET_KEY'].encode(), str(code).encode(), 'sha256').hexdigest()
+
+
+def _username_key(username):
+    """
+    Case-folded form of a username, used for uniqueness and lookups
+
+    Folded in Python rather than with SQL lower(): SQLite's lower() only
+    handles ASCII, so 'Émile' would never match its own row.
+    """
+    return username.casefold()
+
 
 # Database Models
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    username = db.Column(db.String(80), unique=True, nullable=False)
-    email = db.Column(db.String(120), unique=True, nullable=False)
+    username = db.Column(db.String(80), unique=True, index=True, nullable=False)
+    # casefold() expands a code point to at most 3 ('ΐ'), so 80 chars fold to <= 240
+    username_key = db.Column(db.String(240), unique=True, index=True, nullable=False)
+    email = db.Column(db.String(120), unique=True, index=True, nullable=False)
     password_hash = db.Column(db.String(255), nullable=False)
     is_verified = db.Column(db.Boolean, default=False)
-    verification_code = db.Column(db.String(6))
+    verification_code = db.Column(db.String(64))  # HMAC-SHA256 hex digest of the code
     verification_code_expires = db.Column(db.DateTime)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=_utcnow)
+
+    @validates('username')
+    def _sync_username_key(self, key, username):
+        """Keep username_key in step with every assignment to username"""
+        self.username_key = _username_key(username)
+        return username
 
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = _off_loop(ph.hash, password)
 
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        """Verify a password, upgrading legacy or outdated hashes in place.
+
+        The caller commits the session if the hash was replaced.
+        """
+        if not self.password_hash.startswith('$argon2'):
+            # Werkzeug hash created before the switch to Argon2
+            if not _off_loop(check_password_hash, self.password_hash, password):
+                return False
+            self.set_password(password)
+            return True
+
+        if not _verify_hash(self.password_hash, password):
+            return False
+
+        # Calibration can land on a different time_cost per host or restart;
+        # only upgrade hashes that are weaker, so they don't churn back and forth
+        params = extract_parameters(self.password_hash)
+        if (params.time_cost < ph.time_cost or params.memory_cost < ph.memory_cost
+                or params.type != ph.type):
+            self.set_password(password)
+        return True
 
     def generate_verification_code(self):
-        self.verification_code = ''.join([str(secrets.randbelow(10)) for _ in range(6)])
-        self.verification_code_expires = datetime.utcnow() + timedelta(hours=24)
-        return self.verification_code
+        """Create a new code, store only its digest and return the plain code"""
+        code = f'{secrets.randbelow(1_000_000):06d}'
+        self.verification_code = _verification_digest(code)
+        self.verification_code_expires = _utcnow() + timedelta(hours=24)
+        return code
+
+    def verify_code(self, code):
+        """Check a submitted code against the stored digest in constant time"""
+        if not self.verification_code:
+            return False
+        return hmac.compare_digest(self.verification_code, _verification_digest(code))
 
 
 class Character(db.Model):
@@ -51,13 +304,18 @@ class Character(db.Model):
     name = db.Column(db.String(80), unique=True, nullable=False)
     description = db.Column(db.String(255), default='')
     level = db.Column(db.Integer, default=1)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=_utcnow)
     last_login = db.Column(db.DateTime)
     is_active = db.Column(db.Boolean, default=True)
     
     # Relationship back to user
     user = db.relationship('User', backref=db.backref('characters', lazy=True))
     
+    # Every character listing filters on (user_id, is_active)
+    __table_args__ = (
+        db.Index('ix_character_user_active', 'user_id', 'is_active'),
+    )
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -72,6 +330,19 @@ class Character(db.Model):
 # Server start time for uptime tracking
 SERVER_START_TIME = time.time()
 
+# total_users is served from here for a few seconds instead of COUNT(*) per status
+USER_COUNT_TTL_SECONDS = 5
+_user_count_cache = {'value': 0, 'expires': 0.0}
+
+
+def _total_users():
+    """User count, refreshed at most every USER_COUNT_TTL_SECONDS"""
+    now = time.monotonic()
+    if now >= _user_count_cache['expires']:
+        _user_count_cache['value'] = db.session.scalar(db.select(db.func.count(User.id)))
+        _user_count_cache['expires'] = now + USER_COUNT_TTL_SECONDS
+    return _user_count_cache['value']
+
 
 def get_server_status():
     """Get current server status information"""
@@ -82,8 +353,8 @@ def get_server_status():
     return {
         'uptime': f'{hours:02d}:{minutes:02d}:{seconds:02d}',
         'uptime_seconds': uptime_seconds,
-        'connected_users': len(connected_sessions),
-        'total_users': User.query.count(),
+        'connected_users': count_connections(),
+        'total_users': _total_users(),
         'status': 'online'
     }
 
@@ -103,33 +374,84 @@ def terminal():
 def health_check():
     return jsonify({'status': 'healthy', 'message': 'Server is running'})
 
+_EMAIL_RE = re.compile(r'^[^@\s]+@[^@\s]+\.[^@\s]+$')
+
+
+def validate_signup(data):
+    """
+    Validate a signup payload, cheapest checks first.
+
+    Returns an error message, or None if the payload is acceptable. Runs
+    before any database query or password hash, so junk input is rejected
+    without costing either.
+    """
+    if not isinstance(data, dict):
+        return 'Missing required fields'
+    
+    username = data.get('username')
+    email = data.get('email')
+    password = data.get('password')
+    
+    if not username or not email or not password:
+        return 'Missing required fields'
+    
+    if not (isinstance(username, str) and isinstance(email, str) and isinstance(password, str)):
+        return 'Invalid field type'
+    
+    # Column limits; a server database would otherwise fail the INSERT
+    if len(username) > 80:
+        return 'Username must be at most 80 characters'
+    if len(email) > 120:
+        return 'Email must be at most 120 characters'
+    
+    if not _EMAIL_RE.match(email):
+        return 'Invalid email address'
+    
+    return None
+
+
 @app.route('/api/signup', methods=['POST'])
 def signup():
     data = request.get_json()
     
-    if not data or not data.get('username') or not data.get('email') or not data.get('password'):
-        return jsonify({'error': 'Missing required fields'}), 400
-    
-    # Check if user already exists
-    if User.query.filter_by(username=data['username']).first():
-        return jsonify({'error': 'Username already exists'}), 400
+    error = validate_signup(data)
+    if error:
+        return jsonify({'error': error}), 400
     
-    if User.query.filter_by(email=data['email']).first():
-        return jsonify({'error': 'Email already registered'}), 400
+    # Usernames keep their case for display (uniqueness goes through the
+    # folded username_key); emails are stored lower-cased
+    email = data['email'].lower()
     
     # Create new user
     user = User(
         username=data['username'],
-        email=data['email']
+        email=email
     )
     user.set_password(data['password'])
     verification_code = user.generate_verification_code()
     
+    # The unique indexes are the authority on duplicates: no pre-check
+    # round-trips, and concurrent signups can't both get through
     db.session.add(user)
-    db.session.commit()
-    
-    # Send verification email
-    send_verification_email(user.email, verification_code)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        # Driver error text differs per backend, so ask the DB which field
+        # collided: one OR query, at most one row per unique field
+        username_key = _username_key(data['username'])
+        taken = db.session.scalars(
+            db.select(User.username_key).where(db.or_(
+                User.username_key == username_key,
+                User.email == email
+            )).limit(2)
+        ).all()
+        if username_key in taken:
+            return jsonify({'error': 'Username already exists'}), 409
+        return jsonify({'error': 'Email already registered'}), 409
+    
+    # Send verification email in the background; SMTP can take seconds
+    _email_executor.submit(send_verification_email, user.email, verification_code)
     
     return jsonify({
         'message': 'User created successfully. Please check your email for verification code.',
@@ -143,18 +465,23 @@ def verify_email():
     if not data or not data.get('email') or not data.get('code'):
         return jsonify({'error': 'Missing required fields'}), 400
     
-    user = User.query.filter_by(email=data['email']).first()
+    # Non-string JSON values can't match any account
+    email = data['email']
+    user = db.session.scalar(db.select(User).filter_by(email=email.lower())) if isinstance(email, str) else None
     
     if not user:
+        logger.warning("Verification failed - unknown email: %s", data['email'])
         return jsonify({'error': 'User not found'}), 404
     
     if user.is_verified:
         return jsonify({'message': 'Email already verified'}), 200
     
-    if not user.verification_code or user.verification_code != data['code']:
+    if not user.verify_code(data['code']):
+        logger.warning("Verification failed - wrong code for %s", user.email)
         return jsonify({'error': 'Invalid verification code'}), 400
     
-    if user.verification_code_expires < datetime.utcnow():
+    if user.verification_code_expires < _utcnow():
+        logger.warning("Verification failed - expired code for %s", user.email)
         return jsonify({'error': 'Verification code expired'}), 400
     
     user.is_verified = True
@@ -164,6 +491,65 @@ def verify_email():
     
     return jsonify({'message': 'Email verified successfully'}), 200
 
+def _authenticate(username, password):
+    """
+    Credential check shared by /api/login and the Socket.IO authenticate event
+
+    Returns (user, None) on success or (None, reason) with reason 'invalid'
+    or 'unverified'; each transport turns that into its own response.
+    """
+    if not isinstance(username, str) or not isinstance(password, str):
+        return None, 'invalid'
+    
+    # Active characters come back in the same query via a LEFT OUTER JOIN
+    user = db.session.scalars(
+        db.select(User)
+        .options(joinedload(User.characters.and_(Character.is_active.is_(True))))
+        .where(User.username_key == _username_key(username))
+    ).unique().one_or_none()
+    
+    if not user:
+        # Burn one verify anyway so response time doesn't reveal which usernames exist
+        _verify_hash(_DUMMY_HASH, password)
+        logger.warning("Login failed - user not found: %s", username)
+        return None, 'invalid'
+    
+    if not user.check_password(password):
+        logger.warning("Login failed - bad password for %s", user.username)
+        return None, 'invalid'
+    
+    # Persist a password hash upgraded during verification
+    if db.session.is_modified(user):
+        db.session.commit()
+    
+    if not user.is_verified:
+        logger.warning("Login refused - email not verified for %s", user.username)
+        return None, 'unverified'
+    
+    return user, None
+
+
+def _auth_payload(user, message):
+    """
+    Response body for a successful login: user, session token, characters, status
+
+    Expects user.characters to be loaded already filtered to active ones.
+    """
+    user_info = {
+        'id': user.id,
+        'username': user.username,
+        'email': user.email
+    }
+    
+    return {
+        'message': message,
+        'user': user_info,
+        'token': create_session(user_info),
+        'characters': [char.to_dict() for char in user.characters],
+        'server_status': get_server_status()
+    }
+
+
 @app.route('/api/login', methods=['POST'])
 def login():
     data = request.get_json()
@@ -171,27 +557,15 @@ def login():
     if not data or not data.get('username') or not data.get('password'):
         return jsonify({'error': 'Missing required fields'}), 400
     
-    user = User.query.filter_by(username=data['username']).first()
-    
-    if not user or not user.check_password(data['password']):
-        return jsonify({'error': 'Invalid username or password'}), 401
+    user, error = _authenticate(data['username'], data['password'])
     
-    if not user.is_verified:
+    if error == 'unverified':
         return jsonify({'error': 'Email not verified. Please verify your email first.'}), 403
     
-    # Get user's characters
-    characters = [char.to_dict() for char in user.characters if char.is_active]
+    if error:
+        return jsonify({'error': 'Invalid username or password'}), 401
     
-    return jsonify({
-        'message': 'Login successful',
-        'user': {
-            'id': user.id,
-            'username': user.username,
-            'email': user.email
-        },
-        'characters': characters,
-        'server_status': get_server_status()
-    }), 200
+    return jsonify(_auth_payload(user, 'Login successful')), 200
 
 
 @app.route('/api/server-status', methods=['GET'])
@@ -207,7 +581,7 @@ def get_characters():
     if not user_id:
         return jsonify({'error': 'user_id required'}), 400
     
-    characters = Character.query.filter_by(user_id=user_id, is_active=True).all()
+    characters = db.session.scalars(db.select(Character).filter_by(user_id=user_id, is_active=True)).all()
     return jsonify({'characters': [char.to_dict() for char in characters]}), 200
 
 
@@ -219,23 +593,23 @@ def create_character():
     if not data or not data.get('user_id') or not data.get('name'):
         return jsonify({'error': 'Missing required fields (user_id, name)'}), 400
     
-    # Check if user exists
-    user = User.query.get(data['user_id'])
-    if not user:
+    # Check if user exists; only the id is needed, so don't load the row
+    if not db.session.scalar(db.select(db.exists().where(User.id == data['user_id']))):
         return jsonify({'error': 'User not found'}), 404
     
-    # Check if character name is taken
-    if Character.query.filter_by(name=data['name']).first():
-        return jsonify({'error': 'Character name already taken'}), 400
-    
     character = Character(
         user_id=data['user_id'],
         name=data['name'],
         description=data.get('description', '')
     )
     
+    # The unique index on name decides availability, as with signup
     db.session.add(character)
-    db.session.commit()
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({'error': 'Character name already taken'}), 400
     
     return jsonify({
         'message': 'Character created successfully',
@@ -249,7 +623,9 @@ def resend_verification():
     if not data or not data.get('email'):
         return jsonify({'error': 'Email is required'}), 400
     
-    user = User.query.filter_by(email=data['email']).first()
+    # Non-string JSON values can't match any account
+    email = data['email']
+    user = db.session.scalar(db.select(User).filter_by(email=email.lower())) if isinstance(email, str) else None
     
     if not user:
         return jsonify({'error': 'User not found'}), 404
@@ -260,20 +636,16 @@ def resend_verification():
     verification_code = user.generate_verification_code()
     db.session.commit()
     
-    send_verification_email(user.email, verification_code)
+    _email_executor.submit(send_verification_email, user.email, verification_code)
     
     return jsonify({'message': 'Verification code sent'}), 200
 
 # Socket.IO Events
 @socketio.on('connect')
 def handle_connect():
-    print(f'Client connected: {request.sid}')
+    logger.info('Client connected: %s', request.sid)
     # Add to connected sessions as anonymous until authenticated
-    connected_sessions[request.sid] = {
-        'user_id': None,
-        'username': 'guest',
-        'connected_at': datetime.utcnow()
-    }
+    set_connection(request.sid)
     emit('connected', {
         'message': 'Connected to server',
         'sid': request.sid,
@@ -282,13 +654,34 @@ def handle_connect():
 
 @socketio.on('disconnect')
 def handle_disconnect():
-    print(f'Client disconnected: {request.sid}')
+    logger.info('Client disconnected: %s', request.sid)
     # Remove from connected sessions
-    if request.sid in connected_sessions:
-        del connected_sessions[request.sid]
+    remove_connection(request.sid)
 
 @socketio.on('authenticate')
 def handle_authenticate(data):
+    token = data.get('token')
+    
+    # Resume a session issued at login without a user lookup or password hash
+    if token:
+        user_info = get_session(token)
+        if not user_info:
+            emit('auth_error', {'error': 'Invalid or expired session'})
+            return
+        
+        set_connection(request.sid, user_info['id'], user_info['username'])
+        
+        characters = db.session.scalars(db.select(Character).filter_by(user_id=user_info['id'], is_active=True)).all()
+        
+        emit('auth_success', {
+            'message': 'Authentication successful',
+            'user': user_info,
+            'token': token,
+            'characters': [char.to_dict() for char in characters],
+            'server_status': get_server_status()
+        })
+        return
+    
     username = data.get('username')
     password = data.get('password')
     
@@ -296,42 +689,57 @@ def handle_authenticate(data):
         emit('auth_error', {'error': 'Missing credentials'})
         return
     
-    user = User.query.filter_by(username=username).first()
+    user, error = _authenticate(username, password)
     
-    if not user or not user.check_password(password):
-        emit('auth_error', {'error': 'Invalid credentials'})
+    if error == 'unverified':
+        emit('auth_error', {'error': 'Email not verified'})
         return
     
-    if not user.is_verified:
-        emit('auth_error', {'error': 'Email not verified'})
+    if error:
+        emit('auth_error', {'error': 'Invalid credentials'})
         return
     
     # Update connected session with user info
-    connected_sessions[request.sid] = {
-        'user_id': user.id,
-        'username': user.username,
-        'connected_at': datetime.utcnow()
-    }
+    set_connection(request.sid, user.id, user.username)
     
-    # Get user's characters
-    characters = [char.to_dict() for char in user.characters if char.is_active]
-    
-    emit('auth_success', {
-        'message': 'Authentication successful',
-        'user': {
-            'id': user.id,
-            'username': user.username,
-            'email': user.email
-        },
-        'characters': characters,
-        'server_status': get_server_status()
-    })
+    emit('auth_success', _auth_payload(user, 'Authentication successful'))
+
+@socketio.on('logout')
+def handle_logout(data):
+    """Revoke the session token and drop back to guest"""
+    token = (data or {}).get('token')
+    if token:
+        delete_session(token)
+    
+    set_connection(request.sid)
+    emit('logged_out', {'message': 'Logged out'})
 
 @socketio.on('message')
 def handle_message(data):
-    print(f"Received message: {data}")
+    logger.debug("Received message: %s", data)
     emit('message', {'echo': data}, broadcast=False)
 
+# Fixed pieces of the terminal boxes, built once instead of per command
+_BOX_TOP = '\x1b[33m╔════════════════════════════════════════╗\x1b[0m'
+_BOX_SEP = '\x1b[33m╠════════════════════════════════════════╣\x1b[0m'
+_BOX_BOTTOM = '\x1b[33m╚════════════════════════════════════════╝\x1b[0m'
+_BOX_SIDE = '\x1b[33m║\x1b[0m'
+_TITLE_USERS = f'{_BOX_SIDE}         \x1b[1mCONNECTED USERS\x1b[0m              {_BOX_SIDE}'
+_TITLE_SERVER = f'{_BOX_SIDE}        \x1b[1mSERVER INFORMATION\x1b[0m            {_BOX_SIDE}'
+_TITLE_CHARACTERS = f'{_BOX_SIDE}          \x1b[1mYOUR CHARACTERS\x1b[0m             {_BOX_SIDE}'
+_YOU_MARKER = ' \x1b[32m<- you\x1b[0m'
+# Per-row templates, bound once: rows only fill in the dynamic fields
+_WHO_ROW = (_BOX_SIDE + '  \x1b[36m{username:<20}\x1b[0m ({age}){marker}').format_map
+_CHARACTER_ROW = (_BOX_SIDE + '  \x1b[36m{name:<15}\x1b[0m Lv.{level:<3} {description}').format_map
+
+
+def _connected_for(connected_at, now):
+    """Short 'Nm' label for how long a connection has been open (epoch seconds)"""
+    if not connected_at:
+        return '?'
+    mins = (now - connected_at) // 60
+    return f'{mins}m' if mins > 0 else '<1m'
+
 # Terminal command handler - processes text commands from terminal UI
 @socketio.on('command')
 def handle_command(data):
@@ -343,86 +751,61 @@ def handle_command(data):
     
     if cmd == 'who':
         # List connected users
-        response['output'] = [
-            '',
-            '\x1b[33m╔════════════════════════════════════════╗\x1b[0m',
-            '\x1b[33m║\x1b[0m         \x1b[1mCONNECTED USERS\x1b[0m              \x1b[33m║\x1b[0m',
-            '\x1b[33m╠════════════════════════════════════════╣\x1b[0m'
-        ]
-        
-        if connected_sessions:
-            for sid, session in connected_sessions.items():
-                username = session.get('username', 'guest')
-                connected_at = session.get('connected_at')
-                if connected_at:
-                    duration = datetime.utcnow() - connected_at
-                    mins = int(duration.total_seconds() // 60)
-                    time_str = f'{mins}m' if mins > 0 else '<1m'
-                else:
-                    time_str = '?'
-                
-                # Mark current user
-                marker = ' \x1b[32m<- you\x1b[0m' if sid == request.sid else ''
-                response['output'].append(
-                    f'\x1b[33m║\x1b[0m  \x1b[36m{username:<20}\x1b[0m ({time_str}){marker}'
-                )
+        sessions = all_connections()
+        if sessions:
+            now = int(time.time())
+            rows = [
+                _WHO_ROW({
+                    'username': session.username,
+                    'age': _connected_for(session.connected_at, now),
+                    'marker': _YOU_MARKER if sid == request.sid else ''
+                })
+                for sid, session in sessions.items()
+            ]
         else:
-            response['output'].append('\x1b[33m║\x1b[0m  No users connected')
+            rows = [f'{_BOX_SIDE}  No users connected']
         
-        response['output'].extend([
-            '\x1b[33m╚════════════════════════════════════════╝\x1b[0m',
-            f'  Total: {len(connected_sessions)} user(s) online',
-            ''
-        ])
+        response['output'] = [
+            '', _BOX_TOP, _TITLE_USERS, _BOX_SEP,
+            *rows,
+            _BOX_BOTTOM, f'  Total: {len(sessions)} user(s) online', ''
+        ]
         
     elif cmd == 'server_info':
         status = get_server_status()
         response['output'] = [
-            '',
-            '\x1b[33m╔════════════════════════════════════════╗\x1b[0m',
-            '\x1b[33m║\x1b[0m        \x1b[1mSERVER INFORMATION\x1b[0m            \x1b[33m║\x1b[0m',
-            '\x1b[33m╠════════════════════════════════════════╣\x1b[0m',
-            f'\x1b[33m║\x1b[0m  Status:     \x1b[32m{status["status"].upper():<24}\x1b[0m\x1b[33m║\x1b[0m',
-            f'\x1b[33m║\x1b[0m  Uptime:     {status["uptime"]:<24}\x1b[33m║\x1b[0m',
-            f'\x1b[33m║\x1b[0m  Online:     {status["connected_users"]} user(s){" " * 17}\x1b[33m║\x1b[0m',
-            f'\x1b[33m║\x1b[0m  Registered: {status["total_users"]} user(s){" " * 17}\x1b[33m║\x1b[0m',
-            '\x1b[33m╚════════════════════════════════════════╝\x1b[0m',
-            ''
+            '', _BOX_TOP, _TITLE_SERVER, _BOX_SEP,
+            f'{_BOX_SIDE}  Status:     \x1b[32m{status["status"].upper():<24}\x1b[0m{_BOX_SIDE}',
+            f'{_BOX_SIDE}  Uptime:     {status["uptime"]:<24}{_BOX_SIDE}',
+            f'{_BOX_SIDE}  Online:     {status["connected_users"]} user(s){" " * 17}{_BOX_SIDE}',
+            f'{_BOX_SIDE}  Registered: {status["total_users"]} user(s){" " * 17}{_BOX_SIDE}',
+            _BOX_BOTTOM, ''
         ]
     
     elif cmd == 'characters':
         # Get current user's characters
-        session = connected_sessions.get(request.sid, {})
-        user_id = session.get('user_id')
+        session = get_connection(request.sid)
+        user_id = session.user_id if session else None
         
         if not user_id:
             response['error'] = 'You must be logged in to view characters.'
         else:
-            characters = Character.query.filter_by(user_id=user_id, is_active=True).all()
-            response['output'] = [
-                '',
-                '\x1b[33m╔════════════════════════════════════════╗\x1b[0m',
-                '\x1b[33m║\x1b[0m          \x1b[1mYOUR CHARACTERS\x1b[0m             \x1b[33m║\x1b[0m',
-                '\x1b[33m╠════════════════════════════════════════╣\x1b[0m'
-            ]
+            # Only the listed columns, as plain tuples: no ORM objects to hydrate
+            characters = db.session.execute(
+                db.select(Character.name, Character.level, Character.description)
+                .filter_by(user_id=user_id, is_active=True)
+            ).all()
+            rows = [
+                _CHARACTER_ROW({'name': name, 'level': level, 'description': description[:15]})
+                for name, level, description in characters
+            ] or [f'{_BOX_SIDE}  No characters yet. Use \x1b[36mcreate <name>\x1b[0m']
             
-            if characters:
-                for char in characters:
-                    response['output'].append(
-                        f'\x1b[33m║\x1b[0m  \x1b[36m{char.name:<15}\x1b[0m Lv.{char.level:<3} {char.description[:15]}'
-                    )
-            else:
-                response['output'].append('\x1b[33m║\x1b[0m  No characters yet. Use \x1b[36mcreate <name>\x1b[0m')
-            
-            response['output'].extend([
-                '\x1b[33m╚════════════════════════════════════════╝\x1b[0m',
-                ''
-            ])
+            response['output'] = ['', _BOX_TOP, _TITLE_CHARACTERS, _BOX_SEP, *rows, _BOX_BOTTOM, '']
     
     elif cmd == 'create' and args:
         # Create a new character
-        session = connected_sessions.get(request.sid, {})
-        user_id = session.get('user_id')
+        session = get_connection(request.sid)
+        user_id = session.user_id if session else None
         
         if not user_id:
             response['error'] = 'You must be logged in to create a character.'
@@ -430,18 +813,18 @@ def handle_command(data):
             char_name = args[0]
             description = ' '.join(args[1:]) if len(args) > 1 else ''
             
-            # Check if name is taken
-            if Character.query.filter_by(name=char_name).first():
+            character = Character(
+                user_id=user_id,
+                name=char_name,
+                description=description
+            )
+            db.session.add(character)
+            try:
+                db.session.commit()
+            except IntegrityError:
+                db.session.rollback()
                 response['error'] = f'Character name "{char_name}" is already taken.'
             else:
-                character = Character(
-                    user_id=user_id,
-                    name=char_name,
-                    description=description
-                )
-                db.session.add(character)
-                db.session.commit()
-                
                 response['output'] = [
                     '',
                     f'\x1b[32m✓ Character "{char_name}" created successfully!\x1b[0m',
@@ -450,11 +833,84 @@ def handle_command(data):
     else:
         response['error'] = f'Unknown server command: {cmd}'
     
+    # Ship the listing as one pre-joined block: a single JSON string is
+    # smaller and cheaper to encode than an array of short ones. xterm
+    # needs CRLF, and the terminal still writes each output entry as a line.
+    if response['output']:
+        response['output'] = ['\r\n'.join(response['output'])]
+    
     emit('cmd_response', response)
 
+def _migrate_username_key():
+    """
+    Bring a users table created before username_key up to date
+
+    create_all() never alters an existing table, so this adds the column,
+    backfills it, lower-cases stored emails and builds the unique index.
+    Safe to run on every start; refuses to migrate when two accounts only
+    differ by case, since picking a winner is the operator's call.
+    """
+    table = User.__table__
+    with db.engine.begin() as conn:
+        inspector = inspect(conn)
+        if not inspector.has_table(table.name):
+            return
+        if 'username_key' not in {col['name'] for col in inspector.get_columns(table.name)}:
+            # Nullable at the SQL level: SQLite can't add a NOT NULL column without a default
+            conn.exec_driver_sql(
+                f'ALTER TABLE {conn.dialect.identifier_preparer.format_table(table)} '
+                'ADD COLUMN username_key VARCHAR(240)'
+            )
+        else:
+            unkeyed = db.select(db.func.count()).select_from(table).where(table.c.username_key.is_(None))
+            if not conn.scalar(unkeyed):
+                return
+        
+        rows = conn.execute(db.select(table.c.id, table.c.username, table.c.email)).all()
+        seen_keys, seen_emails, clashes, params = {}, {}, [], []
+        for row in rows:
+            key, email = _username_key(row.username), row.email.lower()
+            if key in seen_keys:
+                clashes.append(f'username {row.username!r} (ids {seen_keys[key]} and {row.id})')
+            if email in seen_emails:
+                clashes.append(f'email {email!r} (ids {seen_emails[email]} and {row.id})')
+            seen_keys[key], seen_emails[email] = row.id, row.id
+            params.append({'row_id': row.id, 'key': key, 'folded_email': email})
+        if clashes:
+            raise RuntimeError(
+                'Cannot migrate users table, accounts differ only by case: ' + '; '.join(clashes)
+            )
+        
+        if params:
+            conn.execute(
+                db.update(table)
+                .where(table.c.id == bindparam('row_id'))
+                .values(username_key=bindparam('key'), email=bindparam('folded_email')),
+                params
+            )
+        existing = {index['name'] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing and 'username_key' in index.columns:
+                index.create(conn)
+    logger.info("Migrated %d users to case-insensitive usernames", len(params))
+
+
+# Create tables at import so gunicorn workers (which never run __main__) get them too
+with app.app_context():
+    db.create_all()
+    _migrate_username_key()
+
+
+def _connection_heartbeat():
+    """Keep this worker's registry entries alive so other workers' stale ones age out"""
+    while True:
+        socketio.sleep(CONNECTION_HEARTBEAT_SECONDS)
+        refresh_connections()
+
+
+socketio.start_background_task(_connection_heartbeat)
+
 if __name__ == '__main__':
-    with app.app_context():
-        db.create_all()
-    
+    # Development server; production runs under gunicorn (see Dockerfile.server)
     port = int(os.environ.get('PORT', 5000))
     socketio.run(app, host='0.0.0.0', port=port, debug=True)
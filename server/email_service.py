@@ -1,8 +1,66 @@
+import contextlib
 import os
 import smtplib
+import threading
+import time
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 
+# One SMTP connection per sending thread, kept open between messages so
+# only the first email pays for the TCP connect, STARTTLS and AUTH
+_smtp_local = threading.local()
+# Bound every socket op so a dead server can't hang a send (or the NOOP probe)
+SMTP_TIMEOUT_SECONDS = 10
+# Drop connections idle longer than typical server-side idle limits instead of probing them
+SMTP_IDLE_SECONDS = 60
+
+
+def _close_quietly(conn):
+    try:
+        conn.close()
+    except Exception:
+        pass
+
+
+@contextlib.contextmanager
+def get_smtp(smtp_server, smtp_port, smtp_username, smtp_password):
+    """
+    Yield a logged-in SMTP connection, reusing this thread's if it still answers NOOP
+    """
+    conn = getattr(_smtp_local, 'conn', None)
+    if conn is not None and time.monotonic() - getattr(_smtp_local, 'last_used', 0) > SMTP_IDLE_SECONDS:
+        _close_quietly(conn)
+        conn = _smtp_local.conn = None
+    if conn is not None:
+        try:
+            alive = conn.noop()[0] == 250
+        except (smtplib.SMTPException, OSError):
+            alive = False
+        if not alive:
+            _close_quietly(conn)
+            conn = _smtp_local.conn = None
+    
+    if conn is None:
+        conn = smtplib.SMTP(smtp_server, smtp_port, timeout=SMTP_TIMEOUT_SECONDS)
+        try:
+            conn.starttls()
+            conn.login(smtp_username, smtp_password)
+        except BaseException:
+            # Not cached yet, so nothing else would ever close it
+            conn.close()
+            raise
+        _smtp_local.conn = conn
+    
+    try:
+        yield conn
+    except (smtplib.SMTPException, OSError):
+        # Don't reuse a connection that failed mid-send
+        _smtp_local.conn = None
+        _close_quietly(conn)
+        raise
+    _smtp_local.last_used = time.monotonic()
+
+
 def send_verification_email(to_email, verification_code):
     """
     Send verification email to user
@@ -58,9 +116,7 @@ def send_verification_email(to_email, verification_code):
         message.attach(part2)
         
         # Send email
-        with smtplib.SMTP(smtp_server, smtp_port) as server:
-            server.starttls()
-            server.login(smtp_username, smtp_password)
+        with get_smtp(smtp_server, smtp_port, smtp_username, smtp_password) as server:
             server.send_message(message)
         
         print(f"Verification email sent to {to_email}")
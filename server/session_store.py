@@ -0,0 +1,238 @@
+"""
+Session tokens for authenticated clients.
+
+A successful login issues an opaque token so the Socket.IO `authenticate`
+event can restore the session without another database lookup and password
+hash. Tokens live in Redis when REDIS_URL is set, so every worker sees them;
+otherwise they are kept in-process, which is enough for a single dev server.
+
+The registry of live Socket.IO connections (who is online, as whom) follows
+the same rule, so `who` and the online count cover every worker.
+"""
+
+import json
+import logging
+import os
+import secrets
+import time
+from dataclasses import asdict, dataclass
+
+logger = logging.getLogger('authserver')
+
+SESSION_TTL_SECONDS = int(os.environ.get('SESSION_TTL_HOURS', 24)) * 3600
+
+_redis = None
+# In-process fallback: {token: (expires_at, payload)}
+_local_sessions = {}
+
+# With Redis, live sids are a sorted set scored by their last heartbeat and
+# their details a hash of JSON entries. Sids not refreshed within the TTL
+# (their worker died) are ignored and then pruned.
+CONNECTIONS_KEY = 'connections:live'
+CONNECTION_INFO_KEY = 'connections:info'
+CONNECTION_HEARTBEAT_SECONDS = 30
+CONNECTION_TTL_SECONDS = 3 * CONNECTION_HEARTBEAT_SECONDS
+# Sids registered by this process, refreshed by its heartbeat
+_owned_sids = set()
+# In-process fallback: {sid: Connection}
+_local_connections = {}
+
+
+@dataclass(slots=True)
+class Connection:
+    """Who a connected sid is; one per open socket, so kept dict-free"""
+    user_id: int | None
+    username: str
+    connected_at: int  # epoch seconds
+
+
+def get_redis():
+    """
+    Return the shared Redis client, or None when REDIS_URL is not set
+
+    All server code goes through this one client so it shares a single
+    bounded connection pool rather than opening connections per feature.
+    """
+    global _redis
+    if _redis is None and os.environ.get('REDIS_URL'):
+        import redis
+        pool = redis.ConnectionPool.from_url(
+            os.environ['REDIS_URL'],
+            max_connections=int(os.environ.get('REDIS_MAX_CONNECTIONS', 32))
+        )
+        _redis = redis.Redis(connection_pool=pool)
+    return _redis
+
+
+def create_session(payload):
+    """
+    Store payload under a new random token
+
+    Returns the token, or None if the session store is unavailable
+    """
+    token = secrets.token_urlsafe(32)
+    r = get_redis()
+
+    if r is None:
+        now = time.time()
+        # Drop expired entries so the dict can't grow without bound
+        for key in [k for k, (expires_at, _) in _local_sessions.items() if expires_at < now]:
+            del _local_sessions[key]
+        _local_sessions[token] = (now + SESSION_TTL_SECONDS, payload)
+        return token
+
+    try:
+        r.setex(f'session:{token}', SESSION_TTL_SECONDS, json.dumps(payload))
+    except Exception as e:
+        logger.warning("Session store unavailable: %s", e)
+        return None
+    return token
+
+
+def get_session(token):
+    """Return the payload stored for token, or None if unknown or expired"""
+    r = get_redis()
+
+    if r is None:
+        entry = _local_sessions.get(token)
+        if entry is None:
+            return None
+        expires_at, payload = entry
+        if expires_at < time.time():
+            _local_sessions.pop(token, None)
+            return None
+        return payload
+
+    try:
+        raw = r.get(f'session:{token}')
+    except Exception as e:
+        logger.warning("Session store unavailable: %s", e)
+        return None
+    return json.loads(raw) if raw else None
+
+
+def delete_session(token):
+    """Revoke a token"""
+    r = get_redis()
+
+    if r is None:
+        _local_sessions.pop(token, None)
+        return
+
+    try:
+        r.delete(f'session:{token}')
+    except Exception as e:
+        logger.warning("Session store unavailable: %s", e)
+
+
+def set_connection(sid, user_id=None, username='guest'):
+    """Record (or replace) who is on a connected sid, starting its clock now"""
+    conn = Connection(user_id, username, int(time.time()))
+    r = get_redis()
+
+    if r is None:
+        _local_connections[sid] = conn
+        return
+
+    _owned_sids.add(sid)
+    try:
+        pipe = r.pipeline()
+        pipe.hset(CONNECTION_INFO_KEY, sid, json.dumps(asdict(conn)))
+        pipe.zadd(CONNECTIONS_KEY, {sid: conn.connected_at})
+        pipe.execute()
+    except Exception as e:
+        logger.warning("Session store unavailable: %s", e)
+
+
+def get_connection(sid):
+    """Return the Connection for sid, or None if it isn't registered"""
+    r = get_redis()
+
+    if r is None:
+        return _local_connections.get(sid)
+
+    try:
+        raw = r.hget(CONNECTION_INFO_KEY, sid)
+    except Exception as e:
+        logger.warning("Session store unavailable: %s", e)
+        return None
+    return Connection(**json.loads(raw)) if raw else None
+
+
+def remove_connection(sid):
+    """Forget a disconnected sid"""
+    r = get_redis()
+
+    if r is None:
+        _local_connections.pop(sid, None)
+        return
+
+    _owned_sids.discard(sid)
+    try:
+        pipe = r.pipeline()
+        pipe.zrem(CONNECTIONS_KEY, sid)
+        pipe.hdel(CONNECTION_INFO_KEY, sid)
+        pipe.execute()
+    except Exception as e:
+        logger.warning("Session store unavailable: %s", e)
+
+
+def refresh_connections():
+    """
+    Heartbeat: mark this process's sids as alive and drop expired ones
+
+    Call every CONNECTION_HEARTBEAT_SECONDS. Entries left behind by a
+    crashed or restarted worker stop being refreshed, drop out of counts
+    after CONNECTION_TTL_SECONDS and are deleted by the next heartbeat.
+    """
+    r = get_redis()
+    if r is None:
+        return
+
+    now = int(time.time())
+    try:
+        pipe = r.pipeline()
+        if _owned_sids:
+            pipe.zadd(CONNECTIONS_KEY, {sid: now for sid in _owned_sids}, xx=True)
+        pipe.zrangebyscore(CONNECTIONS_KEY, '-inf', now - CONNECTION_TTL_SECONDS)
+        stale = pipe.execute()[-1]
+        if stale:
+            pipe = r.pipeline()
+            pipe.zrem(CONNECTIONS_KEY, *stale)
+            pipe.hdel(CONNECTION_INFO_KEY, *stale)
+            pipe.execute()
+    except Exception as e:
+        logger.warning("Session store unavailable: %s", e)
+
+
+def all_connections():
+    """Return {sid: Connection} for every live sid across all workers"""
+    r = get_redis()
+
+    if r is None:
+        return dict(_local_connections)
+
+    try:
+        sids = r.zrangebyscore(CONNECTIONS_KEY, int(time.time()) - CONNECTION_TTL_SECONDS, '+inf')
+        infos = r.hmget(CONNECTION_INFO_KEY, sids) if sids else []
+    except Exception as e:
+        logger.warning("Session store unavailable: %s", e)
+        return {}
+    return {
+        sid.decode(): Connection(**json.loads(info))
+        for sid, info in zip(sids, infos) if info
+    }
+
+
+def count_connections():
+    """Number of live sids across all workers"""
+    r = get_redis()
+
+    if r is None:
+        return len(_local_connections)
+
+    try:
+        return r.zcount(CONNECTIONS_KEY, int(time.time()) - CONNECTION_TTL_SECONDS, '+inf')
+    except Exception as e:
+        logger.warning("Session store unavailable: %s", e)
+        return 0
@@ -4,91 +4,229 @@ Validation script for requirements.txt
 This validates that the requirements file is properly formatted and contains expected packages.
 """
 
-import re
+import functools
+import os
 import sys
 
-def validate_requirements(file_path):
-    """Validate requirements.txt file format and content"""
-    
-    print("=" * 60)
-    print("Validating requirements.txt")
-    print("=" * 60)
-    print()
+# Translate tables deleting the characters allowed in each half of a
+# package==version line: a half is valid when nothing is left over
+_DIGITS = '0123456789'
+_NAME_OK = str.maketrans('', '', 'abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ' + _DIGITS + '_-')
+_VERSION_OK = str.maketrans('', '', _DIGITS + '.')
+
+# Pinned versions requirements.txt must contain
+_EXPECTED_PACKAGES = {
+    'Flask': '3.1.2',
+    'Flask-SocketIO': '5.5.1',
+    'Flask-SQLAlchemy': '3.1.1',
+    'Flask-CORS': '6.0.1',
+    'python-socketio': '5.14.3',
+    'Werkzeug': '3.1.3',
+    'requests': '2.32.5',
+    'python-engineio': '4.12.3',
+    'websocket-client': '1.8.0',
+    'argon2-cffi': '25.1.0',
+    'redis': '5.2.1',
+    'gevent': '24.11.1',
+    'gevent-websocket': '0.10.1',
+    'gunicorn': '23.0.0',
+    'orjson': '3.10.15'
+}
+_EXPECTED_KEYS = frozenset(_EXPECTED_PACKAGES)
+# (padded display name, expected version, package) for the report rows
+_ROWS = [(f"{package:25}", version, package) for package, version in _EXPECTED_PACKAGES.items()]
+
+# "stamp<TAB>absolute path" of the last passing version of each file, so an
+# unchanged file skips re-validation. Plain text rather than JSON keeps
+# json (and the re it imports) out of startup.
+_CACHE_FILE = os.path.join(
+    os.environ.get('XDG_CACHE_HOME', os.path.expanduser('~/.cache')),
+    'validate_requirements.cache'
+)
+
+
+def _read_lines(file_path):
+    """Lines of file_path, read with raw os.read calls and decoded once"""
+    fd = os.open(file_path, os.O_RDONLY)
+    try:
+        # st_size is only a first-chunk hint: it is 0 for pipes/FIFOs and reads can be short
+        chunk = os.fstat(fd).st_size or 65536
+        chunks = []
+        while True:
+            data = os.read(fd, chunk)
+            if not data:
+                break
+            chunks.append(data)
+    finally:
+        os.close(fd)
+    return b''.join(chunks).decode('utf-8', 'replace').splitlines()
+
+
+def _parse(lines):
+    """
+    Yield (line_num, line, package_name, version) for each requirement line
+
+    Blank and comment lines are skipped; malformed lines come through with
+    package_name and version set to None.
+    """
+    for line_num, line in enumerate(lines, 1):
+        # Only trailing whitespace is forgiven: an indented line is malformed
+        line = line.rstrip()
+        if not line or line.startswith('#'):
+            continue
+        
+        # Match package==version format
+        package_name, sep, version = line.partition('==')
+        if not (sep and package_name and version
+                and not package_name.translate(_NAME_OK)
+                and not version.translate(_VERSION_OK)):
+            yield line_num, line, None, None
+        else:
+            yield line_num, line, package_name, version
+
+
+def _cache_key(file_path):
+    """(absolute path, stamp of its current contents and of this script's pins)"""
+    st = os.stat(file_path)
+    own = os.stat(__file__)
+    return os.path.abspath(file_path), f"{st.st_mtime_ns}:{st.st_size}:{own.st_mtime_ns}"
+
+
+def _load_cache():
+    """{absolute path: stamp}; one entry per file, so the cache never outgrows the files checked"""
+    cache = {}
+    try:
+        with open(_CACHE_FILE, 'r') as f:
+            for line in f.read().splitlines():
+                stamp, sep, path = line.partition('\t')
+                if sep:
+                    cache[path] = stamp
+    except (OSError, ValueError):
+        pass
+    return cache
+
+
+def _save_cache(cache):
+    try:
+        os.makedirs(os.path.dirname(_CACHE_FILE), exist_ok=True)
+        with open(_CACHE_FILE, 'w') as f:
+            f.write(''.join(f"{stamp}\t{path}\n" for path, stamp in cache.items()))
+    except OSError:
+        pass
+
+
+def validate_requirements(file_path, fast_fail=False, use_cache=True):
+    """Validate requirements.txt file format and content
+
+    With fast_fail, stop and return 1 at the first problem found. With
+    use_cache, a file that already passed unchanged is not re-validated;
+    failures are never cached, so their report is always shown.
+    """
+    try:
+        path, stamp = _cache_key(file_path)
+    except OSError:
+        path = stamp = None
     
-    expected_packages = {
-        'Flask': '3.1.2',
-        'Flask-SocketIO': '5.5.1',
-        'Flask-SQLAlchemy': '3.1.1',
-        'Flask-CORS': '6.0.1',
-        'python-socketio': '5.14.3',
-        'Werkzeug': '3.1.3',
-        'requests': '2.32.5',
-        'python-engineio': '4.12.3'
-    }
+    cache = {}
+    if use_cache and stamp is not None:
+        cache = _load_cache()
+        if cache.get(path) == stamp:
+            sys.stdout.write(f"✓ Requirements file is valid! (cached: {file_path} unchanged)\n")
+            return 0
     
+    # A file that can't be stamped is checked afresh rather than memoized
+    check = _check if stamp is not None else _check.__wrapped__
+    code, report = check(file_path, stamp, fast_fail)
+    sys.stdout.write(report)
+    if use_cache and stamp is not None and code == 0:
+        # Replaces the entry for an older version of the same file
+        cache[path] = stamp
+        _save_cache(cache)
+    return code
+
+
+@functools.lru_cache(maxsize=8)
+def _check(file_path, stamp, fast_fail):
+    """
+    (exit code, report text) for one version of file_path
+
+    Memoized on the same stamp as the disk cache, so callers that import
+    this module and re-check an unchanged file (failing, or with the disk
+    cache off) reuse the result.
+    """
+    # Report lines are collected and written once by the caller
+    out = ["=" * 60, "Validating requirements.txt", "=" * 60, ""]
+    code = _collect(file_path, fast_fail, out)
+    return code, '\n'.join(out) + '\n'
+
+
+def _collect(file_path, fast_fail, out):
+    """Parse and check file_path, appending report lines to out"""
     all_valid = True
     found_packages = {}
     
     try:
-        with open(file_path, 'r') as f:
-            lines = f.readlines()
-        
-        # Parse requirements
-        for line_num, line in enumerate(lines, 1):
-            line = line.strip()
-            if not line or line.startswith('#'):
-                continue
-            
-            # Match package==version format
-            match = re.match(r'^([a-zA-Z0-9_-]+)==([0-9.]+)$', line)
-            if not match:
-                print(f"✗ Line {line_num}: Invalid format: {line}")
+        # Parse requirements; in fast_fail mode pins are checked as they stream in
+        for line_num, line, package_name, version in _parse(_read_lines(file_path)):
+            if package_name is None:
+                out.append(f"✗ Line {line_num}: Invalid format: {line}")
+                if fast_fail:
+                    return 1
                 all_valid = False
                 continue
             
-            package_name = match.group(1)
-            version = match.group(2)
             found_packages[package_name] = version
+            if fast_fail:
+                expected_version = _EXPECTED_PACKAGES.get(package_name)
+                if expected_version is not None and version != expected_version:
+                    out.append(f"✗ {package_name:25} {version} (expected {expected_version})")
+                    return 1
         
         # Verify all expected packages are present
-        print("Package Verification:")
-        print("-" * 60)
-        for package, expected_version in expected_packages.items():
-            if package in found_packages:
-                actual_version = found_packages[package]
-                if actual_version == expected_version:
-                    print(f"✓ {package:25} {actual_version}")
-                else:
-                    print(f"✗ {package:25} {actual_version} (expected {expected_version})")
-                    all_valid = False
+        out.append("Package Verification:")
+        out.append("-" * 60)
+        for padded, expected_version, package in _ROWS:
+            actual_version = found_packages.get(package)
+            if actual_version is None:
+                out.append(f"✗ {padded} MISSING")
+                all_valid = False
+            elif actual_version == expected_version:
+                out.append(f"✓ {padded} {actual_version}")
             else:
-                print(f"✗ {package:25} MISSING")
+                out.append(f"✗ {padded} {actual_version} (expected {expected_version})")
                 all_valid = False
+            if fast_fail and not all_valid:
+                return 1
         
         # Check for unexpected packages
-        extra_packages = set(found_packages.keys()) - set(expected_packages.keys())
+        extra_packages = found_packages.keys() - _EXPECTED_KEYS
         if extra_packages:
-            print(f"\n⚠ Unexpected packages found: {', '.join(extra_packages)}")
+            out.append(f"\n⚠ Unexpected packages found: {', '.join(extra_packages)}")
         
-        print()
-        print("=" * 60)
+        out.append("")
+        out.append("=" * 60)
         if all_valid:
-            print("✓ Requirements file is valid!")
+            out.append("✓ Requirements file is valid!")
             return 0
         else:
-            print("✗ Requirements file has issues")
+            out.append("✗ Requirements file has issues")
             return 1
             
     except FileNotFoundError:
-        print(f"✗ File not found: {file_path}")
+        out.append(f"✗ File not found: {file_path}")
         return 1
     except Exception as e:
-        print(f"✗ Error reading file: {e}")
+        out.append(f"✗ Error reading file: {e}")
         return 1
 
 if __name__ == '__main__':
+    args = sys.argv[1:]
+    fast_fail = '--fast-fail' in args
+    use_cache = '--no-cache' not in args
+    args = [arg for arg in args if arg not in ('--fast-fail', '--no-cache')]
+    
     file_path = 'requirements.txt'
-    if len(sys.argv) > 1:
-        file_path = sys.argv[1]
+    if args:
+        file_path = args[0]
     
-    sys.exit(validate_requirements(file_path))
+    sys.exit(validate_requirements(file_path, fast_fail, use_cache))